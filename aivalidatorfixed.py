@@ -1,9 +1,77 @@
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
 import json
-from typing import Dict, List, Tuple
-from dataclasses import dataclass
-import time
+import re
+import hashlib
+import shelve
+import dbm
+import pickle
+import threading
+from typing import Dict, List, Tuple, Optional
+from dataclasses import dataclass, asdict
+from concurrent.futures import ThreadPoolExecutor
+from smartdbdetector import SmartRelationshipDetector
+
+try:
+    import orjson  # Parser JSON en C, opcional
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+else:
+    _json_loads = json.loads
+    def _json_dumps(obj) -> bytes:
+        return json.dumps(obj).encode('utf-8')
+
+# Objeto JSON dentro de texto libre (desde la primera '{' hasta la última '}')
+_JSON_RE = re.compile(r'\{.*\}', re.DOTALL)
+_NL_TABLE = str.maketrans('\n\r', '  ')
+
+# Límite aproximado de tokens de prompt por lote (≈ 4 caracteres por token)
+MAX_BATCH_PROMPT_TOKENS = 2048
+
+# Contexto del modelo: prompt del sistema + lote + respuesta
+OLLAMA_NUM_CTX = 4096
+
+# Tiempo que Ollama mantiene el modelo cargado entre consultas
+OLLAMA_KEEP_ALIVE = "30m"
+
+# Modelo por defecto: pequeño y cuantizado. Validar una relación es una clasificación
+# sí/no con un JSON corto, así que un 3B en q4 basta y genera varias veces más rápido
+# que un 7B; para más precisión se puede pasar un modelo mayor (p.ej. "llama2:latest").
+DEFAULT_OLLAMA_MODEL = "llama3.2:3b-instruct-q4_K_M"
+
+# Instrucciones comunes a todos los prompts; cada relación se describe en una sola línea
+VALIDATION_INSTRUCTIONS = """Eres un experto en modelado de bases de datos del dominio médico/veterinario.
+Decide si cada relación propuesta (columna origen → columna destino) es una FK válida y lógica para el negocio.
+Formato de cada relación: src/tgt = tabla.columna(tipo ex:valores de ejemplo), name = similitud de nombres,
+type = compatibilidad de tipos, overlap = % de valores de origen presentes en destino, conf = score calculado.
+Considera si los nombres sugieren la relación, si los tipos son compatibles, si el overlap es significativo
+y si la relación tiene sentido en el dominio."""
+
+SINGLE_RESPONSE_FORMAT = """Devuelve solo un JSON válido, en una sola línea:
+{"es_valida": true/false, "confianza_ai": 0-100, "explicacion": "...", "tipo_relacion": "1:1|1:N|N:M", "recomendacion": "Usar como FK|Revisar manualmente|Descartar"}"""
+
+BATCH_RESPONSE_FORMAT = """Devuelve solo un JSON válido, en una sola línea, con un elemento por relación (id = número de la relación):
+{"resultados": [{"id": 1, "es_valida": true/false, "confianza_ai": 0-100, "explicacion": "...", "tipo_relacion": "1:1|1:N|N:M", "recomendacion": "Usar como FK|Revisar manualmente|Descartar"}]}"""
+
+# Prompts del sistema: fijos, así Ollama reutiliza su caché KV entre consultas
+SINGLE_SYSTEM_PROMPT = f"{VALIDATION_INSTRUCTIONS}\n{SINGLE_RESPONSE_FORMAT}"
+BATCH_SYSTEM_PROMPT = f"{VALIDATION_INSTRUCTIONS}\n{BATCH_RESPONSE_FORMAT}"
+
+# Versión de los prompts: forma parte de la clave de caché, así un cambio en las
+# instrucciones invalida los veredictos guardados con los prompts anteriores
+PROMPT_VERSION = hashlib.blake2b(f"{SINGLE_SYSTEM_PROMPT}\n{BATCH_SYSTEM_PROMPT}".encode('utf-8'),
+                                 digest_size=8).hexdigest()
+
+# Errores al abrir o leer la caché (directorio sin permisos, archivo corrupto o en uso)
+CACHE_ERRORS = (*dbm.error, OSError, pickle.UnpicklingError, EOFError)
+
+# Máximo de tokens que puede generar el modelo por cada relación validada
+NUM_PREDICT_PER_RELATIONSHIP = 256
 
 @dataclass
 class ValidationResult:
@@ -16,71 +84,101 @@ class ValidationResult:
     raw_response: str
 
 class AIRelationshipValidator:
-    def __init__(self, ollama_url: str = "http://localhost:11434", model: str = "llama2:latest"):
+    def __init__(self, ollama_url: str = "http://localhost:11434", model: str = DEFAULT_OLLAMA_MODEL,
+                 num_parallel: int = 4, batch_size: int = 4,
+                 cache_path: Optional[str] = ".aivalidator_cache",
+                 auto_accept: Optional[float] = 0.9, auto_reject: Optional[float] = 0.2,
+                 request_timeout: float = 30, verbose: bool = False):
+        """num_parallel: consultas simultáneas a Ollama. Para que el servidor las procese
+        en paralelo hay que lanzarlo con OLLAMA_NUM_PARALLEL >= num_parallel.
+        batch_size: máximo de relaciones agrupadas en un mismo prompt.
+        cache_path: archivo donde se guardan las validaciones ya hechas (None = sin caché).
+        auto_accept / auto_reject: umbrales para resolver sin AI las relaciones evidentes
+        (None desactiva cada uno).
+        request_timeout: segundos de espera por cada relación de una consulta (un lote de
+        N relaciones espera N veces más, porque puede generar N veces más tokens).
+        verbose: muestra la respuesta cruda de cada consulta."""
         self.ollama_url = ollama_url
         self.model = model
-        self.tables_data = {}
+        self.num_parallel = max(1, num_parallel)
+        self.batch_size = max(1, batch_size)
+        self.cache_path = cache_path
+        self.auto_accept = auto_accept
+        self.auto_reject = auto_reject
+        self.request_timeout = request_timeout
+        self.verbose = verbose
+        self._cache_lock = threading.Lock()
+        self._cache_warned = False
+        
+        # Sesión HTTP persistente: reutiliza conexiones (keep-alive) entre consultas
+        self._session = requests.Session()
+        self._session.headers['Content-Type'] = 'application/json'
+        self._session.mount('http://', HTTPAdapter(pool_maxsize=self.num_parallel))
+        self._session.mount('https://', HTTPAdapter(pool_maxsize=self.num_parallel))
+        self._warmed_up = False
+        self._col_features = {}
+        
+    def _warmup(self):
+        """Carga el modelo en memoria antes de la primera consulta (una vez por validador)"""
+        if self._warmed_up:
+            return
+        self._warmed_up = True
+        try:
+            # Un prompt vacío solo carga el modelo; keep_alive lo mantiene cargado durante el análisis.
+            # Se carga con el mismo num_ctx que las consultas para que Ollama no lo recargue
+            self._session.post(
+                f"{self.ollama_url}/api/generate",
+                data=_json_dumps({"model": self.model, "prompt": "", "keep_alive": OLLAMA_KEEP_ALIVE,
+                                  "options": {"num_ctx": OLLAMA_NUM_CTX}}),
+                timeout=120
+            )
+        except requests.RequestException as e:
+            print(f"⚠️  No se pudo precargar el modelo: {e}")
         
     def load_tables(self, tables: Dict[str, pd.DataFrame]):
         """Carga las tablas y prepara información para el contexto"""
-        self.tables_data = {}
+        # Descripción ya formateada de cada columna: se reutiliza en cada relación
+        self._col_features = {}
         for table_name, df in tables.items():
-            self.tables_data[table_name] = {
-                'columns': list(df.columns),
-                'shape': df.shape,
-                'sample': df.head(5).to_dict('records'),
-                'dtypes': df.dtypes.to_dict()
-            }
+            for column, dtype in df.dtypes.items():
+                # Tipo de dato de la columna y un par de valores de ejemplo
+                sample_values = ','.join(df[column].dropna().head(2).astype(str))
+                self._col_features[(table_name, column)] = (
+                    f"{table_name}.{column}({dtype} ex:{sample_values})")
     
     def validate_relationship(self, source_table: str, source_column: str, 
                             target_table: str, target_column: str,
-                            confidence_score: float, evidence: Dict) -> ValidationResult:
-        """Valida una relación específica usando AI"""
+                            confidence_score: float, evidence: Dict,
+                            features: Optional[str] = None) -> ValidationResult:
+        """Valida una relación específica usando AI (features: línea ya preparada, opcional)"""
+        decided = self._short_circuit(source_table, source_column, target_table, target_column,
+                                      confidence_score, evidence)
+        if decided is not None:
+            return decided
         
-        # Preparar el contexto con información correcta
-        context = self._prepare_context(source_table, source_column, target_table, target_column, evidence)
+        cached = self._cache_get(source_table, source_column, target_table, target_column,
+                                 confidence_score, evidence)
+        if cached is not None:
+            return cached
         
-        # Crear prompt mejorado
-        prompt = f"""Analiza la siguiente relación potencial entre columnas de base de datos:
-
-RELACIÓN PROPUESTA:
-- Columna origen: {source_table}.{source_column}
-- Columna destino: {target_table}.{target_column}
-
-CONTEXTO DE LAS TABLAS:
-{context}
-
-EVIDENCIA ENCONTRADA:
-- Similitud de nombres: {evidence.get('name_similarity', 0):.1%}
-- Compatibilidad de tipos: {evidence.get('type_compatibility', 0):.1%}
-- Coincidencia de valores: {evidence.get('value_overlap', {}).get('percentage', 0):.1f}%
-- Score de confianza calculado: {confidence_score:.1%}
-
-PREGUNTA: ¿Es válida y lógica esta relación desde el punto de vista del negocio?
-
-Considera:
-1. ¿Los nombres de las columnas sugieren una relación lógica?
-2. ¿Los tipos de datos son compatibles?
-3. ¿El porcentaje de valores coincidentes es significativo?
-4. ¿La relación tiene sentido en el contexto del dominio (médico/veterinario)?
-
-IMPORTANTE: Devuelve un JSON válido, en una sola línea, sin saltos de línea dentro de strings.
-{{
-    "es_valida": true/false,
-    "confianza_ai": 0-100,
-    "explicacion": "Explicación detallada",
-    "tipo_relacion": "1:1|1:N|N:M",
-    "recomendacion": "Usar como FK|Revisar manualmente|Descartar"
-}}"""
+        if features is None:
+            features = self._prepare_features_line(source_table, source_column, target_table, target_column,
+                                                   confidence_score, evidence)
+        prompt = f"RELACIÓN:\n{features}"
         
         try:
             # Llamar a Ollama
             response = self._call_ollama(prompt)
             
             # Parsear respuesta
-            result = self._parse_ai_response(response, source_table, source_column, 
-                                           target_table, target_column)
+            result, cacheable = self._parse_ai_response(response, source_table, source_column, 
+                                                        target_table, target_column)
             
+            # Solo se guardan las respuestas completas: una respuesta truncada o en texto libre
+            # se vuelve a consultar en el próximo análisis
+            if cacheable:
+                self._cache_put(result, source_table, source_column, target_table, target_column,
+                                confidence_score, evidence)
             return result
             
         except Exception as e:
@@ -94,68 +192,125 @@ IMPORTANTE: Devuelve un JSON válido, en una sola línea, sin saltos de línea d
                 raw_response=""
             )
     
-    def _prepare_context(self, source_table: str, source_column: str,
-                        target_table: str, target_column: str, evidence: Dict) -> str:
-        """Prepara el contexto con información correcta de las tablas"""
-        context_parts = []
+    def _short_circuit(self, source_table: str, source_column: str,
+                       target_table: str, target_column: str,
+                       confidence_score: float, evidence: Dict) -> Optional[ValidationResult]:
+        """Resuelve sin consultar a la AI las relaciones claramente válidas o claramente descartables"""
+        type_compatibility = evidence.get('type_compatibility', 0)
+        value_overlap = evidence.get('value_overlap', {}).get('percentage', 0) / 100
         
-        # Información de la tabla/columna origen
-        if source_table in self.tables_data:
-            source_info = self.tables_data[source_table]
-            context_parts.append(f"\nTabla {source_table}:")
-            context_parts.append(f"- Columnas: {', '.join(source_info['columns'])}")
-            context_parts.append(f"- Registros: {source_info['shape'][0]}")
-            
-            # Tipo de dato de la columna específica
-            if source_column in source_info['dtypes']:
-                context_parts.append(f"- Tipo de {source_column}: {source_info['dtypes'][source_column]}")
-            
-            # Mostrar algunos valores de ejemplo
-            sample_values = []
-            for record in source_info['sample'][:3]:
-                if source_column in record and record[source_column] is not None:
-                    sample_values.append(str(record[source_column]))
-            if sample_values:
-                context_parts.append(f"- Valores ejemplo de {source_column}: {', '.join(sample_values)}")
+        if (self.auto_accept is not None and confidence_score >= self.auto_accept and
+                value_overlap >= self.auto_accept and type_compatibility >= self.auto_accept):
+            is_valid = True
+            explanation = "Aceptada automáticamente: confianza, tipos y coincidencia de valores altos"
+        elif self.auto_reject is not None and confidence_score <= self.auto_reject:
+            is_valid = False
+            explanation = "Descartada automáticamente: confianza calculada muy baja"
+        else:
+            return None
         
-        # Información de la tabla/columna destino
-        if target_table in self.tables_data:
-            target_info = self.tables_data[target_table]
-            context_parts.append(f"\nTabla {target_table}:")
-            context_parts.append(f"- Columnas: {', '.join(target_info['columns'])}")
-            context_parts.append(f"- Registros: {target_info['shape'][0]}")
-            
-            # Tipo de dato de la columna específica
-            if target_column in target_info['dtypes']:
-                context_parts.append(f"- Tipo de {target_column}: {target_info['dtypes'][target_column]}")
-            
-            # Mostrar algunos valores de ejemplo
-            sample_values = []
-            for record in target_info['sample'][:3]:
-                if target_column in record and record[target_column] is not None:
-                    sample_values.append(str(record[target_column]))
-            if sample_values:
-                context_parts.append(f"- Valores ejemplo de {target_column}: {', '.join(sample_values)}")
+        return ValidationResult(
+            source=f"{source_table}.{source_column}",
+            target=f"{target_table}.{target_column}",
+            is_valid=is_valid,
+            confidence=min(confidence_score, 1.0),
+            explanation=explanation,
+            raw_response=""
+        )
+    
+    def _cache_key(self, source_table: str, source_column: str,
+                   target_table: str, target_column: str,
+                   confidence_score: float, evidence: Dict) -> str:
+        """Clave estable de una relación: prompts, modelo, columnas, confianza y evidencia canónica"""
+        canonical = json.dumps([PROMPT_VERSION, self.model, source_table, source_column,
+                                target_table, target_column, round(confidence_score, 3), evidence],
+                               sort_keys=True, default=str)
+        return hashlib.blake2b(canonical.encode('utf-8')).hexdigest()
+    
+    def _cache_get(self, *relationship) -> Optional[ValidationResult]:
+        """Devuelve la validación guardada de una relación, si existe"""
+        if not self.cache_path:
+            return None
+        key = self._cache_key(*relationship)
+        try:
+            with self._cache_lock, shelve.open(self.cache_path) as cache:
+                data = cache.get(key)
+        except CACHE_ERRORS as e:
+            # Una caché inaccesible no detiene el análisis: se trata como si no hubiera dato
+            self._cache_warning(e)
+            return None
+        return ValidationResult(**data) if data is not None else None
+    
+    def _cache_put(self, result: ValidationResult, *relationship):
+        """Guarda la validación de una relación para no volver a consultar a la AI"""
+        if not self.cache_path:
+            return
+        key = self._cache_key(*relationship)
+        try:
+            with self._cache_lock, shelve.open(self.cache_path) as cache:
+                cache[key] = asdict(result)
+        except CACHE_ERRORS as e:
+            self._cache_warning(e)
+    
+    def _cache_warning(self, error: Exception):
+        """Avisa (una sola vez por validador) que la caché no se puede usar"""
+        with self._cache_lock:
+            if self._cache_warned:
+                return
+            self._cache_warned = True
+        print(f"⚠️  No se pudo usar la caché de validaciones ({self.cache_path}): {error}")
+    
+    def _prepare_features_line(self, source_table: str, source_column: str,
+                               target_table: str, target_column: str,
+                               confidence_score: float, evidence: Dict) -> str:
+        """Resume una relación (columnas, tipos, ejemplos y evidencia) en una sola línea"""
+        source = self._col_features.get((source_table, source_column), f"{source_table}.{source_column}")
+        target = self._col_features.get((target_table, target_column), f"{target_table}.{target_column}")
         
-        return '\n'.join(context_parts)
+        return (f"src={source} tgt={target} "
+                f"name={evidence.get('name_similarity', 0):.2f} "
+                f"type={evidence.get('type_compatibility', 0):.2f} "
+                f"overlap={evidence.get('value_overlap', {}).get('percentage', 0):.1f}% "
+                f"conf={confidence_score:.2f}")
     
-    def _call_ollama(self, prompt: str) -> str:
-        """Llama a Ollama y obtiene la respuesta"""
+    def _prepare_batch_prompt(self, relationships: List[Tuple]) -> str:
+        """Crea el mensaje de usuario que pide el veredicto de varias relaciones numeradas"""
+        lines = '\n'.join(f"[{i}] {relationship[6]}"
+                          for i, relationship in enumerate(relationships, 1))
+        return f"RELACIONES:\n{lines}"
+    
+    def _call_ollama(self, prompt: str, system_prompt: str = SINGLE_SYSTEM_PROMPT,
+                     num_predict: int = NUM_PREDICT_PER_RELATIONSHIP) -> str:
+        """Llama a Ollama (modo chat) y obtiene la respuesta"""
         try:
-            response = requests.post(
-                f"{self.ollama_url}/api/generate",
-                json={
+            response = self._session.post(
+                f"{self.ollama_url}/api/chat",
+                data=_json_dumps({
                     "model": self.model,
-                    "prompt": prompt,
+                    # Las instrucciones van en el mensaje del sistema, idéntico en todas las
+                    # consultas: Ollama reutiliza ese prefijo y solo procesa el mensaje del usuario
+                    "messages": [
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": prompt}
+                    ],
                     "stream": False,
-                    "temperature": 0.1  # Baja temperatura para respuestas más consistentes
-                },
-                timeout=30
+                    # Modo JSON: el modelo responde solo con el objeto, sin texto adicional
+                    "format": "json",
+                    "keep_alive": OLLAMA_KEEP_ALIVE,
+                    "options": {
+                        "temperature": 0.1,  # Baja temperatura para respuestas más consistentes
+                        "num_ctx": OLLAMA_NUM_CTX,
+                        "num_predict": num_predict
+                    }
+                }),
+                # El tiempo de espera crece con los tokens que se le permite generar al modelo
+                timeout=self.request_timeout * max(1, num_predict / NUM_PREDICT_PER_RELATIONSHIP)
             )
             
             if response.status_code == 200:
-                raw= response.json()['response']
-                print(f"\n📥 Respuesta AI cruda:\n{raw}\n")
+                raw = _json_loads(response.content)['message']['content']
+                if self.verbose:
+                    print(f"\n📥 Respuesta AI cruda:\n{raw}\n")
                 return raw
             else:
                 raise Exception(f"Error HTTP: {response.status_code}")
@@ -165,19 +320,36 @@ IMPORTANTE: Devuelve un JSON válido, en una sola línea, sin saltos de línea d
         except Exception as e:
             raise Exception(f"Error al llamar a Ollama: {str(e)}")
     
+    def _load_json(self, response: str) -> Optional[Dict]:
+        """Carga el JSON de la respuesta; None si la respuesta no contiene un objeto JSON"""
+        try:
+            # Con format=json la respuesta ya es JSON puro
+            data = _json_loads(response)
+            return data if isinstance(data, dict) else None
+        except json.JSONDecodeError:
+            pass
+        
+        # Modelos sin modo JSON: extraer el objeto del texto libre
+        match = _JSON_RE.search(response)
+        if match is None:
+            return None
+        
+        return _json_loads(match.group(0).translate(_NL_TABLE))
+    
+    @staticmethod
+    def _is_complete_answer(data: Dict) -> bool:
+        """Indica si un veredicto JSON trae una confianza numérica (solo esos se guardan en caché)"""
+        confidence = data.get('confianza_ai')
+        return isinstance(confidence, (int, float)) and not isinstance(confidence, bool)
+    
     def _parse_ai_response(self, response: str, source_table: str, source_column: str,
-                          target_table: str, target_column: str) -> ValidationResult:
-        """Parsea la respuesta de la AI"""
+                          target_table: str, target_column: str) -> Tuple[ValidationResult, bool]:
+        """Parsea la respuesta de la AI; devuelve el resultado y si puede guardarse en caché"""
         try:
             # Intentar extraer JSON de la respuesta
-            json_start = response.find('{')
-            json_end = response.rfind('}') + 1
+            data = self._load_json(response)
             
-            if json_start >= 0 and json_end > json_start:
-                json_str = response[json_start:json_end]
-                json_str = json_str.replace('\n', ' ').replace('\r', ' ')
-                data = json.loads(json_str)
-                
+            if data is not None:
                 return ValidationResult(
                     source=f"{source_table}.{source_column}",
                     target=f"{target_table}.{target_column}",
@@ -185,7 +357,7 @@ IMPORTANTE: Devuelve un JSON válido, en una sola línea, sin saltos de línea d
                     confidence=data.get('confianza_ai', 0) / 100,
                     explanation=data.get('explicacion', 'Sin explicación'),
                     raw_response=response
-                )
+                ), self._is_complete_answer(data)
             else:
                 # Si no hay JSON, intentar interpretar la respuesta
                 is_valid = 'válida' in response.lower() or 'correcta' in response.lower()
@@ -196,7 +368,7 @@ IMPORTANTE: Devuelve un JSON válido, en una sola línea, sin saltos de línea d
                     confidence=0.5,
                     explanation=response[:200],
                     raw_response=response
-                )
+                ), False
                 
         except Exception as e:
             print(f"⚠️ Error parseando respuesta AI: {e}")
@@ -207,43 +379,167 @@ IMPORTANTE: Devuelve un JSON válido, en una sola línea, sin saltos de línea d
                 confidence=0.0,
                 explanation=f"Error parseando: {str(e)}",
                 raw_response=response
-            )
+            ), False
     
-    def validate_batch(self, relationships: List[Tuple], tables: Dict[str, pd.DataFrame]) -> List[ValidationResult]:
-        """Valida un batch de relaciones"""
+    def _parse_ai_batch_response(self, response: str,
+                                 relationships: List[Tuple]) -> Dict[int, Tuple[ValidationResult, bool]]:
+        """Parsea la respuesta de un prompt por lotes; devuelve por posición el resultado
+        y si puede guardarse en caché"""
+        results = {}
+        try:
+            data = self._load_json(response)
+            items = data.get('resultados', []) if data is not None else []
+        except Exception as e:
+            print(f"⚠️ Error parseando respuesta AI por lotes: {e}")
+            return results
+        
+        # Cada elemento se parsea por separado: uno mal formado no descarta los demás
+        for item in items:
+            try:
+                index = int(item.get('id', 0)) - 1
+                if not 0 <= index < len(relationships) or index in results:
+                    continue
+                
+                source_table, source_column, target_table, target_column = relationships[index][:4]
+                results[index] = ValidationResult(
+                    source=f"{source_table}.{source_column}",
+                    target=f"{target_table}.{target_column}",
+                    is_valid=item.get('es_valida', False),
+                    confidence=item.get('confianza_ai', 0) / 100,
+                    explanation=item.get('explicacion', 'Sin explicación'),
+                    raw_response=response
+                ), self._is_complete_answer(item)
+            except Exception as e:
+                print(f"⚠️ Error parseando un elemento de la respuesta AI por lotes: {e}")
+        
+        return results
+    
+    def _chunk_relationships(self, relationships: List[Tuple]) -> List[List[Tuple]]:
+        """Agrupa relaciones consecutivas (con su línea de features) en lotes de hasta
+        batch_size sin exceder el límite de tokens"""
+        chunks = []
+        current, current_tokens = [], 0
+        for relationship in relationships:
+            tokens = len(relationship[6]) // 4
+            if current and (len(current) >= self.batch_size or
+                            current_tokens + tokens > MAX_BATCH_PROMPT_TOKENS):
+                chunks.append(current)
+                current, current_tokens = [], 0
+            current.append(relationship)
+            current_tokens += tokens
+        if current:
+            chunks.append(current)
+        return chunks
+    
+    def _validate_chunk(self, relationships: List[Tuple]) -> List[ValidationResult]:
+        """Valida un lote de relaciones con una sola consulta a la AI"""
+        results = {}
+        for i, relationship in enumerate(relationships):
+            cached = self._cache_get(*relationship[:6])
+            if cached is not None:
+                results[i] = cached
+        
+        pending = [i for i in range(len(relationships)) if i not in results]
+        if len(pending) > 1:
+            batch = [relationships[i] for i in pending]
+            try:
+                response = self._call_ollama(self._prepare_batch_prompt(batch),
+                                             system_prompt=BATCH_SYSTEM_PROMPT,
+                                             num_predict=NUM_PREDICT_PER_RELATIONSHIP * len(batch))
+            except Exception as e:
+                # Si la consulta falló (Ollama caído o lento), repetirla relación por relación
+                # solo sumaría esperas: todo el lote queda con error
+                print(f"❌ Error al validar lote con AI: {e}")
+                for j, (source_table, source_column, target_table, target_column, *_) in enumerate(batch):
+                    results[pending[j]] = ValidationResult(
+                        source=f"{source_table}.{source_column}",
+                        target=f"{target_table}.{target_column}",
+                        is_valid=False,
+                        confidence=0.0,
+                        explanation=f"Error: {str(e)}",
+                        raw_response=""
+                    )
+                parsed = {}
+            else:
+                parsed = self._parse_ai_batch_response(response, batch)
+            
+            for j, (result, cacheable) in parsed.items():
+                results[pending[j]] = result
+                if cacheable:
+                    self._cache_put(result, *batch[j][:6])
+        
+        # Las relaciones que faltan en una respuesta recibida se validan individualmente
+        return [results[i] if i in results else self.validate_relationship(*relationship)
+                for i, relationship in enumerate(relationships)]
+    
+    def validate_batch(self, relationships: List[Tuple],
+                       tables: Optional[Dict[str, pd.DataFrame]] = None) -> List[ValidationResult]:
+        """Valida un batch de relaciones (tables=None reutiliza las tablas ya cargadas)"""
         # Cargar información de las tablas
-        self.load_tables(tables)
+        if tables is not None:
+            self.load_tables(tables)
         
-        results = []
         total = len(relationships)
         
         print(f"\n🤖 VALIDACIÓN AI - Modelo: {self.model}")
         print("=" * 60)
         
+        # Solo se validan relaciones con formato tabla.columna
+        pending = []
         for i, (source, target, confidence, evidence) in enumerate(relationships, 1):
             source_parts = source.split('.')
             target_parts = target.split('.')
             
             if len(source_parts) == 2 and len(target_parts) == 2:
-                print(f"\n[{i}/{total}] Validando con AI:")
-                print(f"   {source} → {target}")
-                print(f"   🤖 Consultando {self.model}...")
-                
-                result = self.validate_relationship(
-                    source_parts[0], source_parts[1],
-                    target_parts[0], target_parts[1],
-                    confidence, evidence
-                )
-                
-                # Mostrar resultado
-                status = "✅ VÁLIDA" if result.is_valid else "❌ NO VÁLIDA"
-                print(f"   Resultado: {status} (Confianza AI: {result.confidence:.1%})")
-                print(f"   Explicación: {result.explanation[:200]}...")
-                
-                results.append(result)
-                
-                # Pequeña pausa para no sobrecargar
-                time.sleep(0.5)
+                pending.append((i, source, target,
+                                (source_parts[0], source_parts[1],
+                                 target_parts[0], target_parts[1],
+                                 confidence, evidence)))
+        
+        # Las relaciones evidentes se resuelven sin AI; solo el resto se consulta
+        results = [self._short_circuit(*relationship) for *_, relationship in pending]
+        relationships_to_validate = [relationship for (*_, relationship), result in zip(pending, results)
+                                     if result is None]
+        
+        # Relaciones repetidas (misma clave: columnas, confianza y evidencia exactas)
+        # se consultan una sola vez y comparten el resultado
+        unique_positions = {}
+        positions = [unique_positions.setdefault(self._cache_key(*relationship), len(unique_positions))
+                     for relationship in relationships_to_validate]
+        unique_relationships = {}
+        for relationship, position in zip(relationships_to_validate, positions):
+            if position not in unique_relationships:
+                # La línea de cada relación se formatea una sola vez y viaja con la relación
+                unique_relationships[position] = relationship + (self._prepare_features_line(*relationship),)
+        relationships_to_validate = list(unique_relationships.values())
+        
+        # El modelo se carga una sola vez, antes de las consultas en paralelo
+        if relationships_to_validate:
+            self._warmup()
+        
+        # Varias relaciones por prompt amortizan la parte común (instrucciones y red)
+        chunks = self._chunk_relationships(relationships_to_validate)
+        
+        print(f"   🤖 Consultando {self.model} ({len(relationships_to_validate)} relaciones en {len(chunks)} lotes, "
+              f"{self.num_parallel} en paralelo; {len(pending) - len(relationships_to_validate)} resueltas sin AI)...")
+        
+        # Las consultas se lanzan en paralelo; Ollama encola las que excedan OLLAMA_NUM_PARALLEL
+        with ThreadPoolExecutor(max_workers=self.num_parallel) as executor:
+            validated = [result for chunk_results in executor.map(self._validate_chunk, chunks)
+                         for result in chunk_results]
+        validated = iter([validated[position] for position in positions])
+        results = [result if result is not None else next(validated) for result in results]
+        
+        # Mostrar resultados (en el orden original) con una sola escritura al final
+        log_lines = []
+        for (i, source, target, _), result in zip(pending, results):
+            status = "✅ VÁLIDA" if result.is_valid else "❌ NO VÁLIDA"
+            log_lines.append(f"\n[{i}/{total}] Validación AI:")
+            log_lines.append(f"   {source} → {target}")
+            log_lines.append(f"   Resultado: {status} (Confianza AI: {result.confidence:.1%})")
+            log_lines.append(f"   Explicación: {result.explanation[:200]}...")
+        if log_lines:
+            print('\n'.join(log_lines))
         
         return results
 
@@ -251,23 +547,24 @@ IMPORTANTE: Devuelve un JSON válido, en una sola línea, sin saltos de línea d
 # Función de integración completa
 def analyze_database_with_ai(tables: Dict[str, pd.DataFrame], 
                            top_n: int = 10,
-                           ollama_model: str = "llama2:latest"):
+                           ollama_model: str = DEFAULT_OLLAMA_MODEL):
     """Análisis completo: detección + validación con AI"""
     
     print("🚀 ANÁLISIS COMPLETO DE BASE DE DATOS")
     print("=" * 60)
     
-    # Fase 1: Detección inteligente
-    from smartdbdetector import SmartRelationshipDetector
+    # Fase 1: Detección inteligente, en segundo plano mientras se prepara el validador
+    validator = AIRelationshipValidator(model=ollama_model)
     
-    detector = SmartRelationshipDetector(tables)
-    candidates = detector.find_relationships()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        detection = executor.submit(lambda: SmartRelationshipDetector(tables).find_relationships())
+        validator.load_tables(tables)
+        validator._warmup()
+        candidates = detection.result()
     
     print(f"\n✅ Se encontraron {len(candidates)} relaciones potenciales")
     
     # Fase 2: Validación con AI de las top N
-    validator = AIRelationshipValidator(model=ollama_model)
-    
     # Preparar datos para validación
     relationships_to_validate = []
     for candidate in candidates[:top_n]:
@@ -279,7 +576,7 @@ def analyze_database_with_ai(tables: Dict[str, pd.DataFrame],
         ))
     
     # Validar con AI
-    validation_results = validator.validate_batch(relationships_to_validate, tables)
+    validation_results = validator.validate_batch(relationships_to_validate)
     
     # Resumen final
     print("\n📊 RESUMEN FINAL")
@@ -310,6 +607,6 @@ if __name__ == "__main__":
     # candidates, validations = analyze_database_with_ai(
     #     tables, 
     #     top_n=10,
-    #     ollama_model="llama2:latest"
+    #     ollama_model="llama3.2:3b-instruct-q4_K_M"
     # )
     pass
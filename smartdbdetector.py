@@ -1,13 +1,53 @@
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Tuple, Set, Any
+from typing import Dict, List, Tuple, Any, Optional
 from dataclasses import dataclass
-from datetime import datetime
 import re
 from difflib import SequenceMatcher
-from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import heapq
 import json
 
+# Tipos numéricos según dtype.kind (bool, enteros con y sin signo, float, complejo)
+NUMERIC_KINDS = 'biufc'
+
+# Columnas genéricas: el mismo nombre en dos tablas no implica relación
+GENERIC_COLUMNS = frozenset([
+    'id', 'uid', 'uuid', 'name', 'description', 'created_at', 
+    'updated_at', 'status', 'type', 'date', 'time', 'timestamp',
+    'active', 'deleted', 'enabled', 'visible'
+])
+
+# Patrones de valores, compilados una sola vez
+NUMERIC_RE = re.compile(r'^\d+$')
+UUID_RE = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$', re.I)
+DATE_RE = re.compile(r'^\d{4}-\d{2}-\d{2}')
+PHONE_RE = re.compile(r'^[\d\-\+\(\)]+$')
+
+# Patrón de ID que es solo un literal anclado al final ('_id$') o exacto ('^id$')
+LITERAL_ANCHORED_RE = re.compile(r'^(\^?)(\w+)\$$')
+
+# Separadores de palabras en nombres de columnas (guiones, espacios y camelCase)
+NAME_SEPARATOR_RE = re.compile(r'[_\-\s]+')
+CAMEL_CASE_RE = re.compile(r'(?<!^)(?=[A-Z])')
+
+# Familias de tipos de datos compatibles entre sí
+NUMERIC_TYPES = ('int', 'float', 'decimal', 'numeric')
+STRING_TYPES = ('object', 'string', 'varchar', 'text')
+
+# Familias como bits: un tipo puede pertenecer a ambas (se comparan con &)
+NUMERIC_FAMILY = 1
+STRING_FAMILY = 2
+
+# Patrones de valores similares entre sí
+SIMILAR_PATTERNS = {
+    'numeric': ['numeric', 'alphanumeric'],
+    'uuid': ['uuid', 'alphanumeric'],
+    'email': ['email'],
+    'date': ['date'],
+    'phone': ['phone', 'numeric']
+}
+
 @dataclass
 class ColumnProfile:
     """Perfil completo de una columna"""
@@ -20,9 +60,19 @@ class ColumnProfile:
     value_patterns: Dict[str, int]
     numeric_stats: Dict[str, float] = None
 
+@dataclass
+class ColumnStats:
+    """Estadísticas básicas de una columna, calculadas una sola vez"""
+    unique_count: int
+    null_count: int
+
 @dataclass
 class RelationshipCandidate:
     """Candidato a relación entre columnas"""
+    # Sin __dict__ por instancia: se crean muchos candidatos
+    __slots__ = ('source_table', 'source_column', 'target_table', 'target_column',
+                 'confidence_score', 'evidence')
+    
     source_table: str
     source_column: str
     target_table: str
@@ -30,11 +80,47 @@ class RelationshipCandidate:
     confidence_score: float
     evidence: Dict[str, Any]
 
+def _count_sorted_intersection(a: np.ndarray, b: np.ndarray) -> int:
+    """Cuenta los valores comunes entre dos arreglos ordenados y sin repetidos"""
+    # Se busca el arreglo chico dentro del grande: O(m log n), sin concatenar ni reordenar
+    if len(a) > len(b):
+        a, b = b, a
+    if len(a) == 0:
+        return 0
+    positions = np.minimum(np.searchsorted(b, a), len(b) - 1)
+    return int(np.count_nonzero(b[positions] == a))
+
+# Detector compartido por cada proceso del pool (se pasa una sola vez al iniciar el proceso)
+_worker_detector = None
+
+def _init_worker(detector: 'SmartRelationshipDetector'):
+    """Inicializa un proceso del pool con el detector ya analizado"""
+    global _worker_detector
+    _worker_detector = detector
+
+def _evaluate_source_in_worker(source_key: str) -> List['RelationshipCandidate']:
+    """Evalúa en un proceso del pool todas las relaciones de una columna origen"""
+    return _worker_detector._evaluate_source(source_key)
+
 class SmartRelationshipDetector:
-    def __init__(self, tables: Dict[str, pd.DataFrame]):
+    def __init__(self, tables: Dict[str, pd.DataFrame], n_jobs: int = 1,
+                 random_state: Optional[int] = None):
+        """n_jobs: procesos para comparar columnas en paralelo (1 = sin paralelismo).
+        random_state: semilla para las muestras de valores (None = no reproducible)."""
         self.tables = tables
+        self.n_jobs = max(1, n_jobs)
+        # Un único generador para todas las muestras: reproducible si se fija la semilla
+        self._rng = np.random.default_rng(random_state)
         self.column_profiles = {}
         self.primary_keys = {}
+        # Valores únicos no nulos y estadísticas por columna, calculados una sola vez
+        self._unique_values = {}
+        self._value_sets = {}
+        self._column_stats = {}
+        # Familias (numérica / texto) de cada tipo de dato, calculadas una sola vez
+        self._type_families = {}
+        # Clase de valores (numérico / fecha / texto) de cada columna
+        self._value_kinds = {}
         
         # Patrones comunes para identificar IDs
         self.common_id_patterns = [
@@ -60,6 +146,7 @@ class SmartRelationshipDetector:
             'pet': ['pet', 'animal', 'patient', 'mascota'],
             'owner': ['owner', 'client', 'customer', 'dueño', 'propietario']
         } ### revieww
+        self._prepare_name_lookups()
         
     def analyze_columns(self):
         """Analiza todas las columnas y crea perfiles detallados"""
@@ -81,6 +168,11 @@ class SmartRelationshipDetector:
                 print(f"  - {column}{pk_marker}: {profile.data_type}, "
                       f"{profile.unique_count} únicos, "
                       f"{profile.null_count} nulos")
+        
+        # Perfiles agrupados por tabla: cada columna se compara solo con las de otras tablas
+        self._profiles_by_table = {}
+        for profile in self.column_profiles.values():
+            self._profiles_by_table.setdefault(profile.table_name, []).append(profile)
     
     def _detect_primary_keys(self):
         """Detecta las claves primarias probables de cada tabla"""
@@ -91,13 +183,14 @@ class SmartRelationshipDetector:
             
             for column in df.columns:
                 col_data = df[column]
+                stats = self._get_column_stats(table_name, column)
                 
                 # Criterios para PK:
                 # 1. No tiene nulos
                 # 2. Todos los valores son únicos
                 # 3. El nombre sugiere que es PK
-                if (col_data.notna().all() and 
-                    col_data.nunique() == len(df) and
+                if (stats.null_count == 0 and 
+                    stats.unique_count == len(df) and
                     len(df) > 0):
                     
                     col_lower = column.lower()
@@ -122,7 +215,7 @@ class SmartRelationshipDetector:
                             pk_candidates.append((column, 70))
                     
                     # Prioridad baja: columna numérica única sin nombre claro
-                    elif pd.api.types.is_numeric_dtype(col_data):
+                    elif col_data.dtype.kind in NUMERIC_KINDS:
                         pk_candidates.append((column, 40))
                     
                     # Muy baja prioridad: otras columnas únicas
@@ -144,26 +237,27 @@ class SmartRelationshipDetector:
         # Obtener valores únicos no nulos
         non_null_data = col_data.dropna()
         sample_size = min(100, len(non_null_data))
-        sample_values = non_null_data.sample(n=sample_size).tolist() if len(non_null_data) > 0 else []
+        sample_values = non_null_data.sample(n=sample_size, random_state=self._rng).tolist() if len(non_null_data) > 0 else []
         
         # Detectar patrones en los valores
         value_patterns = self._detect_value_patterns(non_null_data)
         
         # Estadísticas numéricas si aplica
         numeric_stats = None
-        if pd.api.types.is_numeric_dtype(col_data):
+        if col_data.dtype.kind in NUMERIC_KINDS:
             numeric_stats = {
                 'min': float(col_data.min()) if len(non_null_data) > 0 else None,
                 'max': float(col_data.max()) if len(non_null_data) > 0 else None,
                 'mean': float(col_data.mean()) if len(non_null_data) > 0 else None
             }
         
+        stats = self._get_column_stats(table_name, column)
         return ColumnProfile(
             table_name=table_name,
             column_name=column,
             data_type=str(col_data.dtype),
-            unique_count=col_data.nunique(),
-            null_count=col_data.isna().sum(),
+            unique_count=stats.unique_count,
+            null_count=stats.null_count,
             sample_values=sample_values,
             value_patterns=value_patterns,
             numeric_stats=numeric_stats
@@ -180,49 +274,81 @@ class SmartRelationshipDetector:
             'alphanumeric': 0
         }        ####reviewww
         
-        for value in data.dropna().astype(str).head(100):
-            if re.match(r'^\d+$', value):
+        # Solo se convierten a texto los 100 valores que se revisan (y solo si no lo son ya)
+        values = data.dropna().head(100)
+        if pd.api.types.infer_dtype(values, skipna=True) != 'string':
+            values = values.astype(str)
+        
+        for value in values:
+            if NUMERIC_RE.match(value):
                 patterns['numeric'] += 1
-            elif re.match(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$', value, re.I):
+            elif UUID_RE.match(value):
                 patterns['uuid'] += 1
             elif '@' in value and '.' in value:
                 patterns['email'] += 1
-            elif re.match(r'^\d{4}-\d{2}-\d{2}', value):
+            elif DATE_RE.match(value):
                 patterns['date'] += 1
-            elif re.match(r'^[\d\-\+\(\)]+$', value) and len(value) >= 7:
+            elif PHONE_RE.match(value) and len(value) >= 7:
                 patterns['phone'] += 1
             else:
                 patterns['alphanumeric'] += 1
                 
         return patterns
     
-    def find_relationships(self) -> List[RelationshipCandidate]:
-        """Encuentra relaciones potenciales entre columnas"""
+    def find_relationships(self, top_n: Optional[int] = None) -> List[RelationshipCandidate]:
+        """Encuentra relaciones potenciales entre columnas (top_n: solo las N mejores)"""
         print("\n🔗 Buscando relaciones potenciales...")
         candidates = []
         
         # Primero, analizar columnas
         self.analyze_columns()
         
-        # Comparar cada par de columnas de diferentes tablas
-        for source_key, source_profile in self.column_profiles.items():
-            for target_key, target_profile in self.column_profiles.items():
-                # Skip si es la misma tabla
-                if source_profile.table_name == target_profile.table_name:
+        # Preparar patrones y mapeos una sola vez (pueden haberse personalizado tras crear el detector)
+        self._prepare_name_lookups()
+        
+        # Comparar cada par de columnas de diferentes tablas (cada columna origen es independiente)
+        source_keys = list(self.column_profiles)
+        if self.n_jobs > 1 and len(source_keys) > 1:
+            with ProcessPoolExecutor(max_workers=self.n_jobs, initializer=_init_worker,
+                                     initargs=(self,)) as executor:
+                for source_candidates in executor.map(_evaluate_source_in_worker, source_keys,
+                                                      chunksize=max(1, len(source_keys) // (self.n_jobs * 4))):
+                    candidates.extend(source_candidates)
+        else:
+            for source_key in source_keys:
+                candidates.extend(self._evaluate_source(source_key))
+        
+        # Eliminar duplicados (A->B y B->A) antes de ordenar: se ordenan menos candidatos
+        unique_candidates = self._remove_duplicate_relationships(candidates)
+        
+        # Ordenar por confianza (si solo se piden las top N, selección parcial O(N log k))
+        if top_n is not None:
+            return heapq.nlargest(top_n, unique_candidates, key=lambda x: x.confidence_score)
+        unique_candidates.sort(key=lambda x: x.confidence_score, reverse=True)
+        return unique_candidates
+    
+    def _evaluate_source(self, source_key: str) -> List[RelationshipCandidate]:
+        """Evalúa una columna origen contra todas las columnas de las demás tablas"""
+        source_profile = self.column_profiles[source_key]
+        source_is_pk = self.primary_keys.get(source_profile.table_name) == source_profile.column_name
+        candidates = []
+        for table_name, target_profiles in self._profiles_by_table.items():
+            # Skip si es la misma tabla (una vez por tabla, no por columna)
+            if table_name == source_profile.table_name:
+                continue
+            
+            target_pk = self.primary_keys.get(table_name)
+            for target_profile in target_profiles:
+                # PK contra PK nunca supera el umbral: -0.5 de penalización y nombre 0,
+                # así que como máximo suma 0.1 + 0.5 + 0.1 - 0.5 = 0.2
+                if source_is_pk and target_profile.column_name == target_pk:
                     continue
                 
                 # Evaluar si pueden estar relacionadas
                 candidate = self._evaluate_relationship(source_profile, target_profile)
                 if candidate and candidate.confidence_score > 0.3:  # Umbral mínimo
                     candidates.append(candidate)
-        
-        # Ordenar por confianza
-        candidates.sort(key=lambda x: x.confidence_score, reverse=True)
-        
-        # Eliminar duplicados (A->B y B->A)
-        unique_candidates = self._remove_duplicate_relationships(candidates)
-        
-        return unique_candidates
+        return candidates
     
     def _evaluate_relationship(self, source: ColumnProfile, target: ColumnProfile) -> RelationshipCandidate:
         """Evalúa si dos columnas pueden estar relacionadas"""
@@ -249,8 +375,11 @@ class SmartRelationshipDetector:
         evidence['type_compatibility'] = type_score
         scores.append(type_score * 0.1)  # 10% peso
         
-        # 3. Coincidencia de valores
-        value_score, value_overlap = self._calculate_value_overlap(source, target)
+        # 3. Coincidencia de valores (valores de clases distintas nunca son iguales: no se calcula)
+        if self._values_comparable(source, target):
+            value_score, value_overlap = self._calculate_value_overlap(source, target)
+        else:
+            value_score, value_overlap = 0.0, 0.0
         evidence['value_overlap'] = {
             'score': value_score,
             'percentage': value_overlap
@@ -265,9 +394,7 @@ class SmartRelationshipDetector:
         # BONUS: Si detectamos un patrón FK clásico, dar bonus
         if target_is_pk and not source_is_pk:
             # Verificar si el nombre de source sugiere FK a target
-            source_base = source.column_name.lower()
-            for pattern in self.common_id_patterns:
-                source_base = re.sub(pattern, '', source_base)
+            source_base = self._get_fk_base_name(source.column_name)
             
             target_table_name = target.table_name.lower().rstrip('s')
             if source_base == target_table_name or source_base + 's' == target.table_name.lower():
@@ -289,6 +416,44 @@ class SmartRelationshipDetector:
             )
         return None
     
+    def _prepare_name_lookups(self):
+        """Compila los patrones de ID (se aplican en orden) e indexa los mapeos semánticos"""
+        # Los patrones simples ('_id$', '^id$') se resuelven con operaciones de string;
+        # solo los demás se compilan como regex
+        self._id_pattern_rules = []
+        for pattern in self.common_id_patterns:
+            literal = LITERAL_ANCHORED_RE.match(pattern)
+            if literal is None:
+                self._id_pattern_rules.append(('regex', re.compile(pattern)))
+            elif literal.group(1):
+                self._id_pattern_rules.append(('exact', literal.group(2)))
+            else:
+                self._id_pattern_rules.append(('suffix', literal.group(2)))
+        # Índice inverso: sinónimo -> conceptos que lo incluyen (una palabra puede estar en varios)
+        self._synonym_concepts = {}
+        for concept, variations in self.common_name_mappings.items():
+            for variation in variations:
+                self._synonym_concepts.setdefault(variation, []).append(concept)
+        # Nombre base y componentes de cada columna, se recalculan con los nuevos patrones
+        self._fk_base_names = {}
+        self._name_components = {}
+    
+    def _get_fk_base_name(self, column_name: str) -> str:
+        """Devuelve (y cachea) el nombre de la columna sin sufijos de ID"""
+        if column_name not in self._fk_base_names:
+            base_name = column_name.lower()
+            for kind, pattern in self._id_pattern_rules:
+                if kind == 'suffix':
+                    if base_name.endswith(pattern):
+                        base_name = base_name[:-len(pattern)]
+                elif kind == 'exact':
+                    if base_name == pattern:
+                        base_name = ''
+                else:
+                    base_name = pattern.sub('', base_name)
+            self._fk_base_names[column_name] = base_name
+        return self._fk_base_names[column_name]
+    
     def _calculate_name_similarity(self, source: ColumnProfile, target: ColumnProfile) -> float:
         """Calcula similitud semántica entre nombres de columnas"""
         source_name = source.column_name.lower()
@@ -316,11 +481,10 @@ class SmartRelationshipDetector:
                     return 0.9
                 
                 # Verificar contra mapeos semánticos
-                for concept, variations in self.common_name_mappings.items():
-                    if component in variations:
-                        for var in variations:
-                            if self._words_are_related(var, target_table.rstrip('s')):
-                                return 0.85
+                for concept in self._synonym_concepts.get(component, ()):
+                    for var in self.common_name_mappings[concept]:
+                        if self._words_are_related(var, target_table.rstrip('s')):
+                            return 0.85
         
         # REGLA 4: Patrón inverso
         if source_is_pk and not target_is_pk:
@@ -358,17 +522,20 @@ class SmartRelationshipDetector:
         return 0.0
     
     def _extract_name_components(self, column_name: str) -> Dict:
-        """Extrae componentes semánticos de un nombre de columna"""
+        """Extrae componentes semánticos de un nombre de columna (cacheado: no modificar el resultado)"""
+        if column_name in self._name_components:
+            return self._name_components[column_name]
+        
         # Separar por guiones bajos, camelCase, y otros separadores
         parts = []
         
         # Primero separar por guiones bajos y guiones
-        temp_parts = re.split(r'[_\-\s]+', column_name)
+        temp_parts = NAME_SEPARATOR_RE.split(column_name)
         
         # Luego separar camelCase y PascalCase
         for part in temp_parts:
             # Insertar espacios antes de mayúsculas
-            spaced = re.sub(r'(?<!^)(?=[A-Z])', ' ', part)
+            spaced = CAMEL_CASE_RE.sub(' ', part)
             parts.extend(spaced.lower().split())
         
         # Filtrar partes vacías
@@ -386,12 +553,14 @@ class SmartRelationshipDetector:
                 if part.endswith('s') and len(part) > 2:
                     base_words.add(part[:-1])
         
-        return {
+        components = {
             'all_words': set(parts),
             'base_words': base_words,
             'has_id_component': has_id,
             'original': column_name
         }
+        self._name_components[column_name] = components
+        return components
     
     def _words_are_related(self, word1: str, word2: str) -> bool:
         """Verifica si dos palabras están relacionadas semánticamente"""
@@ -413,20 +582,16 @@ class SmartRelationshipDetector:
             return True
         
         # Verificar en mapeos semánticos
-        for concept, variations in self.common_name_mappings.items():
-            if word1 in variations and word2 in variations:
+        concepts2 = self._synonym_concepts.get(word2, ())
+        for concept in self._synonym_concepts.get(word1, ()):
+            if concept in concepts2:
                 return True
         
         return False
     
     def _is_generic_column(self, column_name: str) -> bool:
         """Determina si una columna es genérica"""
-        generic_columns = [
-            'id', 'uid', 'uuid', 'name', 'description', 'created_at', 
-            'updated_at', 'status', 'type', 'date', 'time', 'timestamp',
-            'active', 'deleted', 'enabled', 'visible'
-        ]
-        return column_name.lower() in generic_columns
+        return column_name.lower() in GENERIC_COLUMNS
     
     def _check_type_compatibility(self, source: ColumnProfile, target: ColumnProfile) -> float:
         """Verifica compatibilidad de tipos de datos"""
@@ -437,40 +602,79 @@ class SmartRelationshipDetector:
         if source_type == target_type:
             return 1.0
         
-        # Tipos numéricos compatibles
-        numeric_types = ['int', 'float', 'decimal', 'numeric']
-        if any(t in source_type.lower() for t in numeric_types) and \
-           any(t in target_type.lower() for t in numeric_types):
-            return 0.8
-        
-        # String types compatibles
-        string_types = ['object', 'string', 'varchar', 'text']
-        if any(t in source_type.lower() for t in string_types) and \
-           any(t in target_type.lower() for t in string_types):
+        # Tipos numéricos o de texto compatibles
+        if self._get_type_families(source_type) & self._get_type_families(target_type):
             return 0.8
         
         return 0.0
     
+    def _get_type_families(self, data_type: str) -> int:
+        """Devuelve (y cachea) las familias de un tipo de dato como bits"""
+        if data_type not in self._type_families:
+            type_lower = data_type.lower()
+            families = 0
+            if any(t in type_lower for t in NUMERIC_TYPES):
+                families |= NUMERIC_FAMILY
+            if any(t in type_lower for t in STRING_TYPES):
+                families |= STRING_FAMILY
+            self._type_families[data_type] = families
+        return self._type_families[data_type]
+    
+    def _get_value_kind(self, table_name: str, column: str) -> Optional[str]:
+        """Devuelve (y cachea) la clase de valores de una columna: 'numeric', 'datetime',
+        'string' o None si el dtype no lo determina (object, mixtos)"""
+        key = (table_name, column)
+        if key not in self._value_kinds:
+            dtype = self.tables[table_name][column].dtype
+            # Categóricas: se comparan por el tipo de sus categorías
+            if isinstance(dtype, pd.CategoricalDtype):
+                dtype = dtype.categories.dtype
+            
+            if isinstance(dtype, pd.StringDtype):
+                kind = 'string'
+            elif dtype.kind in NUMERIC_KINDS:
+                kind = 'numeric'
+            elif dtype.kind in 'Mm':
+                kind = 'datetime'
+            else:
+                kind = None
+            self._value_kinds[key] = kind
+        return self._value_kinds[key]
+    
+    def _values_comparable(self, source: ColumnProfile, target: ColumnProfile) -> bool:
+        """Indica si dos columnas pueden compartir valores (False solo si sus clases difieren)"""
+        source_kind = self._get_value_kind(source.table_name, source.column_name)
+        target_kind = self._get_value_kind(target.table_name, target.column_name)
+        return source_kind is None or target_kind is None or source_kind == target_kind
+    
     def _calculate_value_overlap(self, source: ColumnProfile, target: ColumnProfile) -> Tuple[float, float]:
         """Calcula el porcentaje de valores que coinciden entre columnas"""
         if not source.sample_values or not target.sample_values:
             return 0.0, 0.0
         
-        # Obtener valores únicos de cada columna
-        source_df = self.tables[source.table_name]
-        target_df = self.tables[target.table_name]
+        # Rangos numéricos disjuntos: no puede haber valores en común
+        if source.numeric_stats and target.numeric_stats and (
+                source.numeric_stats['max'] < target.numeric_stats['min'] or
+                target.numeric_stats['max'] < source.numeric_stats['min']):
+            return 0.0, 0.0
         
-        source_values = set(source_df[source.column_name].dropna().unique())
-        target_values = set(target_df[target.column_name].dropna().unique())
+        # Obtener valores únicos de cada columna
+        source_values = self._get_unique_values(source.table_name, source.column_name)
+        target_values = self._get_unique_values(target.table_name, target.column_name)
         
-        if not source_values or not target_values:
+        if len(source_values) == 0 or len(target_values) == 0:
             return 0.0, 0.0
         
-        # Calcular intersección
-        intersection = source_values & target_values
+        # Calcular intersección: entre columnas enteras, sobre los arreglos ordenados;
+        # en otro caso, con los sets ya construidos (solo se recorre el más chico)
+        if source_values.dtype == np.int64 and target_values.dtype == np.int64:
+            intersection_size = _count_sorted_intersection(source_values.to_numpy(), target_values.to_numpy())
+        else:
+            intersection_size = len(self._get_value_set(source.table_name, source.column_name) &
+                                    self._get_value_set(target.table_name, target.column_name))
         
         # Porcentaje de valores de source que están en target
-        overlap_percentage = len(intersection) / len(source_values) * 100
+        overlap_percentage = intersection_size / len(source_values) * 100
         
         # Score basado en el overlap
         if overlap_percentage > 80:
@@ -486,6 +690,35 @@ class SmartRelationshipDetector:
         
         return score, overlap_percentage
     
+    def _get_unique_values(self, table_name: str, column: str) -> pd.Index:
+        """Devuelve (y cachea) los valores únicos no nulos de una columna"""
+        key = (table_name, column)
+        if key not in self._unique_values:
+            values = self.tables[table_name][column].dropna()
+            if values.dtype.kind == 'i':
+                # IDs enteros: arreglo int64 ordenado (hash y comparación nativos)
+                self._unique_values[key] = pd.Index(np.unique(values.to_numpy(dtype=np.int64)))
+            else:
+                self._unique_values[key] = pd.Index(values.unique())
+        return self._unique_values[key]
+    
+    def _get_value_set(self, table_name: str, column: str) -> frozenset:
+        """Devuelve (y cachea) los valores únicos de una columna como set de Python"""
+        key = (table_name, column)
+        if key not in self._value_sets:
+            self._value_sets[key] = frozenset(self._get_unique_values(table_name, column))
+        return self._value_sets[key]
+    
+    def _get_column_stats(self, table_name: str, column: str) -> ColumnStats:
+        """Devuelve (y cachea) únicos y nulos de una columna, compartidos por PKs y perfiles"""
+        key = (table_name, column)
+        if key not in self._column_stats:
+            self._column_stats[key] = ColumnStats(
+                unique_count=len(self._get_unique_values(table_name, column)),
+                null_count=int(self.tables[table_name][column].isna().sum())
+            )
+        return self._column_stats[key]
+    
     def _compare_patterns(self, source: ColumnProfile, target: ColumnProfile) -> float:
         """Compara patrones de datos entre columnas"""
         if not source.value_patterns or not target.value_patterns:
@@ -499,37 +732,28 @@ class SmartRelationshipDetector:
             return 1.0
         
         # Patrones similares
-        similar_patterns = {
-            'numeric': ['numeric', 'alphanumeric'],
-            'uuid': ['uuid', 'alphanumeric'],
-            'email': ['email'],
-            'date': ['date'],
-            'phone': ['phone', 'numeric']
-        }
-        
-        if source_dominant in similar_patterns:
-            if target_dominant in similar_patterns[source_dominant]:
+        if source_dominant in SIMILAR_PATTERNS:
+            if target_dominant in SIMILAR_PATTERNS[source_dominant]:
                 return 0.7
         
         return 0.0
     
     def _remove_duplicate_relationships(self, candidates: List[RelationshipCandidate]) -> List[RelationshipCandidate]:
-        """Elimina relaciones duplicadas (A->B y B->A)"""
-        seen = set()
-        unique = []
-        
-        for candidate in candidates:
-            # Crear clave única ordenada
-            key = tuple(sorted([
-                f"{candidate.source_table}.{candidate.source_column}",
-                f"{candidate.target_table}.{candidate.target_column}"
-            ]))
+        """Elimina relaciones duplicadas (A->B y B->A), conservando la de mayor confianza"""
+        best = {}
+        
+        for index, candidate in enumerate(candidates):
+            # Crear clave única ordenada (tuplas: sin formatear strings por candidato)
+            source = (candidate.source_table, candidate.source_column)
+            target = (candidate.target_table, candidate.target_column)
+            key = (source, target) if source <= target else (target, source)
             
-            if key not in seen:
-                seen.add(key)
-                unique.append(candidate)
+            # Ante empate se conserva la primera, igual que al ordenar de forma estable
+            if key not in best or candidate.confidence_score > best[key][1].confidence_score:
+                best[key] = (index, candidate)
         
-        return unique
+        # Mantener el orden original entre las conservadas
+        return [candidate for _, candidate in sorted(best.values(), key=lambda x: x[0])]
     
     def print_results(self, candidates: List[RelationshipCandidate], top_n: int = 10):
         """Imprime los resultados de forma legible"""
@@ -590,8 +814,10 @@ class SmartRelationshipDetector:
                 'evidence': candidate.evidence
             })
         
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(results, f, indent=2, ensure_ascii=False)
+        # Serializar una vez y escribir el archivo completo de una sola vez
+        payload = json.dumps(results, indent=2, ensure_ascii=False).encode('utf-8')
+        with open(filename, 'wb') as f:
+            f.write(payload)
         
         print(f"\n💾 Resultados exportados a: {filename}")
 
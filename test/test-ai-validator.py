@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Prueba del validador AI sin necesidad de un servidor Ollama:
+se reemplaza la llamada al modelo por respuestas fijas
+"""
+
+import os
+import tempfile
+import pandas as pd
+from aivalidatorfixed import AIRelationshipValidator
+
+def create_test_data():
+    """Crea tablas mínimas para el contexto de los prompts"""
+    patients = pd.DataFrame({
+        'id': [1, 2, 3],
+        'name': ['John Doe', 'Jane Smith', 'Bob Johnson']
+    })
+
+    pets = pd.DataFrame({
+        'id': [101, 102, 103],
+        'patient_id': [1, 1, 2],
+        'name': ['Fluffy', 'Max', 'Luna']
+    })
+
+    return {
+        'patients': patients,
+        'pets': pets
+    }
+
+def create_validator(responses, cache_path=None):
+    """Crea un validador cuyas llamadas a Ollama devuelven las respuestas indicadas"""
+    validator = AIRelationshipValidator(cache_path=cache_path)
+    prompts = []
+
+    def fake_call_ollama(prompt, **kwargs):
+        prompts.append(prompt)
+        response = responses.pop(0)
+        # Una excepción en la lista simula una consulta fallida
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    validator._call_ollama = fake_call_ollama
+    validator._warmup = lambda: None
+    return validator, prompts
+
+def test_batch_validation():
+    """Prueba que varias relaciones se validan con un solo prompt"""
+    print("🧪 TEST: Validación AI por lotes")
+    print("=" * 60)
+
+    tables = create_test_data()
+    relationships = [
+        ('pets.patient_id', 'patients.id', 0.9, {'name_similarity': 0.9}),
+        ('pets.name', 'patients.name', 0.4, {'name_similarity': 0.1})
+    ]
+
+    validator, prompts = create_validator([
+        '{"resultados": [{"id": 1, "es_valida": true, "confianza_ai": 95, "explicacion": "FK clásica"}, '
+        '{"id": 2, "es_valida": false, "confianza_ai": 20, "explicacion": "Nombres genéricos"}]}'
+    ])
+    results = validator.validate_batch(relationships, tables)
+
+    if len(prompts) == 1:
+        print("\n✅ CORRECTO: Se usó un único prompt para el lote")
+    else:
+        print(f"\n❌ ERROR: Se usaron {len(prompts)} prompts")
+
+    expected = [True, False]
+    if [r.is_valid for r in results] == expected:
+        print("✅ CORRECTO: Los veredictos se asignaron a cada relación")
+    else:
+        print(f"❌ ERROR: Veredictos inesperados: {[r.is_valid for r in results]}")
+
+def test_batch_fallback():
+    """Prueba que las relaciones que faltan en la respuesta se validan individualmente"""
+    print("\n\n🧪 TEST: Respuesta por lotes incompleta")
+    print("=" * 60)
+
+    tables = create_test_data()
+    relationships = [
+        ('pets.patient_id', 'patients.id', 0.9, {}),
+        ('pets.name', 'patients.name', 0.4, {})
+    ]
+
+    validator, prompts = create_validator([
+        '{"resultados": [{"id": 1, "es_valida": true, "confianza_ai": 95, "explicacion": "FK clásica"}]}',
+        '{"es_valida": false, "confianza_ai": 10, "explicacion": "Individual"}'
+    ])
+    results = validator.validate_batch(relationships, tables)
+
+    if len(prompts) == 2 and results[1].explanation == "Individual":
+        print("\n✅ CORRECTO: La relación faltante se validó individualmente")
+    else:
+        print("\n❌ ERROR: No se validó la relación faltante")
+
+def test_batch_malformed_item():
+    """Prueba que un elemento mal formado no descarta el resto de la respuesta por lotes"""
+    print("\n\n🧪 TEST: Elemento mal formado en la respuesta por lotes")
+    print("=" * 60)
+
+    tables = create_test_data()
+    relationships = [
+        ('pets.patient_id', 'patients.id', 0.9, {}),
+        ('pets.name', 'patients.name', 0.4, {})
+    ]
+
+    validator, prompts = create_validator([
+        '{"resultados": [{"id": 1, "confianza_ai": null}, '
+        '{"id": 2, "es_valida": true, "confianza_ai": 50, "explicacion": "Del lote"}]}',
+        '{"es_valida": true, "confianza_ai": 90, "explicacion": "Individual"}'
+    ])
+    results = validator.validate_batch(relationships, tables)
+
+    if len(prompts) == 2 and [r.explanation for r in results] == ["Individual", "Del lote"]:
+        print("\n✅ CORRECTO: Solo el elemento mal formado se validó individualmente")
+    else:
+        print(f"\n❌ ERROR: {len(prompts)} prompts, explicaciones {[r.explanation for r in results]}")
+
+def test_batch_request_error():
+    """Prueba que si falla la consulta por lotes no se repite relación por relación"""
+    print("\n\n🧪 TEST: Consulta por lotes fallida")
+    print("=" * 60)
+
+    tables = create_test_data()
+    relationships = [
+        ('pets.patient_id', 'patients.id', 0.9, {}),
+        ('pets.name', 'patients.name', 0.4, {})
+    ]
+
+    validator, prompts = create_validator([Exception("No se puede conectar con Ollama")])
+    results = validator.validate_batch(relationships, tables)
+
+    if len(prompts) == 1 and all(r.explanation.startswith("Error") for r in results):
+        print("\n✅ CORRECTO: El lote fallido no se reintentó individualmente")
+    else:
+        print(f"\n❌ ERROR: {len(prompts)} prompts, explicaciones {[r.explanation for r in results]}")
+
+def test_short_circuit():
+    """Prueba que las relaciones evidentes se resuelven sin consultar a la AI"""
+    print("\n\n🧪 TEST: Relaciones resueltas sin AI")
+    print("=" * 60)
+
+    tables = create_test_data()
+    strong_evidence = {
+        'name_similarity': 0.9,
+        'type_compatibility': 1.0,
+        'value_overlap': {'score': 1.0, 'percentage': 100.0}
+    }
+    relationships = [
+        ('pets.patient_id', 'patients.id', 1.1, strong_evidence),
+        ('pets.name', 'patients.name', 0.1, {'name_similarity': 0.1})
+    ]
+
+    validator, prompts = create_validator([])
+    results = validator.validate_batch(relationships, tables)
+
+    if not prompts and [r.is_valid for r in results] == [True, False]:
+        print("\n✅ CORRECTO: Aceptada y descartada sin consultar a la AI")
+    else:
+        print(f"\n❌ ERROR: {len(prompts)} prompts, veredictos {[r.is_valid for r in results]}")
+
+def test_duplicate_relationships():
+    """Prueba que una relación repetida se consulta una sola vez"""
+    print("\n\n🧪 TEST: Relaciones repetidas")
+    print("=" * 60)
+
+    tables = create_test_data()
+    relationships = [
+        ('pets.patient_id', 'patients.id', 0.6, {'name_similarity': 0.9}),
+        ('pets.patient_id', 'patients.id', 0.6, {'name_similarity': 0.9})
+    ]
+
+    validator, prompts = create_validator([
+        '{"es_valida": true, "confianza_ai": 95, "explicacion": "FK clásica"}'
+    ])
+    results = validator.validate_batch(relationships, tables)
+
+    if len(prompts) == 1 and [r.is_valid for r in results] == [True, True]:
+        print("\n✅ CORRECTO: La relación repetida se validó una sola vez")
+    else:
+        print(f"\n❌ ERROR: {len(prompts)} prompts, veredictos {[r.is_valid for r in results]}")
+
+def test_similar_relationships():
+    """Prueba que relaciones con la misma línea de features pero distinta evidencia no comparten veredicto"""
+    print("\n\n🧪 TEST: Relaciones parecidas")
+    print("=" * 60)
+
+    tables = create_test_data()
+    relationships = [
+        ('pets.patient_id', 'patients.id', 0.601, {'name_similarity': 0.9, 'pattern_similarity': 1.0}),
+        ('pets.patient_id', 'patients.id', 0.604, {'name_similarity': 0.9, 'pattern_similarity': 0.0})
+    ]
+
+    validator, prompts = create_validator([
+        '{"resultados": [{"id": 1, "es_valida": true, "confianza_ai": 95, "explicacion": "Primera"}, '
+        '{"id": 2, "es_valida": false, "confianza_ai": 30, "explicacion": "Segunda"}]}'
+    ])
+    results = validator.validate_batch(relationships, tables)
+
+    if [r.explanation for r in results] == ["Primera", "Segunda"]:
+        print("\n✅ CORRECTO: Cada relación recibió su propio veredicto")
+    else:
+        print(f"\n❌ ERROR: Explicaciones {[r.explanation for r in results]}")
+
+def test_cache():
+    """Prueba que solo se guardan en caché las respuestas completas"""
+    print("\n\n🧪 TEST: Caché de validaciones")
+    print("=" * 60)
+
+    tables = create_test_data()
+    relationships = [
+        ('pets.patient_id', 'patients.id', 0.6, {'name_similarity': 0.9})
+    ]
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache_path = os.path.join(directory, 'cache')
+
+        # Respuesta truncada: no debe guardarse
+        validator, prompts = create_validator(['{"es_valida": true, "confianza_ai": "alta"'], cache_path)
+        validator.validate_batch(relationships, tables)
+
+        validator, prompts = create_validator([
+            '{"es_valida": true, "confianza_ai": 95, "explicacion": "FK clásica"}'
+        ], cache_path)
+        results = validator.validate_batch(relationships, tables)
+
+        if len(prompts) == 1 and results[0].confidence == 0.95:
+            print("\n✅ CORRECTO: La respuesta truncada no se guardó en caché")
+        else:
+            print(f"\n❌ ERROR: {len(prompts)} prompts tras una respuesta truncada")
+
+        # Respuesta completa: la siguiente ejecución no consulta a la AI
+        validator, prompts = create_validator([], cache_path)
+        results = validator.validate_batch(relationships, tables)
+
+        if not prompts and results[0].explanation == "FK clásica":
+            print("✅ CORRECTO: La respuesta completa se reutilizó desde la caché")
+        else:
+            print(f"❌ ERROR: {len(prompts)} prompts con la respuesta ya guardada")
+
+def test_cache_unavailable():
+    """Prueba que una caché inaccesible no detiene la validación"""
+    print("\n\n🧪 TEST: Caché inaccesible")
+    print("=" * 60)
+
+    tables = create_test_data()
+    relationships = [
+        ('pets.patient_id', 'patients.id', 0.6, {'name_similarity': 0.9})
+    ]
+
+    validator, prompts = create_validator([
+        '{"es_valida": true, "confianza_ai": 95, "explicacion": "FK clásica"}'
+    ], '/nonexistent_dir/cache')
+    try:
+        results = validator.validate_batch(relationships, tables)
+    except Exception as e:
+        print(f"\n❌ ERROR: La validación falló por la caché: {e}")
+        return
+
+    if len(prompts) == 1 and results[0].is_valid:
+        print("\n✅ CORRECTO: Se validó sin caché")
+    else:
+        print(f"\n❌ ERROR: {len(prompts)} prompts, veredictos {[r.is_valid for r in results]}")
+
+if __name__ == "__main__":
+    test_batch_validation()
+    test_batch_fallback()
+    test_batch_malformed_item()
+    test_batch_request_error()
+    test_short_circuit()
+    test_duplicate_relationships()
+    test_similar_relationships()
+    test_cache()
+    test_cache_unavailable()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Prueba de las opciones del detector sobre la base de ejemplo complex_ecommerce.db:
+los resultados no deben depender de cómo se ejecuta la detección
+"""
+
+import os
+import sqlite3
+import pandas as pd
+from smartdbdetector import SmartRelationshipDetector
+
+DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'complex_ecommerce.db')
+
+def load_test_database():
+    """Carga todas las tablas de la base de ejemplo"""
+    with sqlite3.connect(DB_PATH) as conn:
+        table_names = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")]
+        return {name: pd.read_sql_query(f'SELECT * FROM "{name}"', conn) for name in table_names}
+
+def candidate_key(candidate):
+    """Campos comparables de un candidato"""
+    return (candidate.source_table, candidate.source_column,
+            candidate.target_table, candidate.target_column,
+            candidate.confidence_score, candidate.evidence)
+
+def test_parallel_detection():
+    """Prueba que n_jobs > 1 encuentra los mismos candidatos que la ejecución secuencial"""
+    print("🧪 TEST: Detección en paralelo (n_jobs)")
+    print("=" * 60)
+
+    tables = load_test_database()
+    sequential = SmartRelationshipDetector(tables, random_state=0).find_relationships()
+    parallel = SmartRelationshipDetector(tables, n_jobs=3, random_state=0).find_relationships()
+
+    if [candidate_key(c) for c in sequential] == [candidate_key(c) for c in parallel]:
+        print(f"\n✅ CORRECTO: n_jobs=3 y n_jobs=1 encuentran los mismos {len(sequential)} candidatos")
+    else:
+        print(f"\n❌ ERROR: n_jobs=1 encontró {len(sequential)} candidatos y n_jobs=3 {len(parallel)}")
+
+def test_top_n():
+    """Prueba que find_relationships(top_n=k) devuelve los mismos k primeros que la lista completa"""
+    print("\n\n🧪 TEST: Solo las N mejores relaciones (top_n)")
+    print("=" * 60)
+
+    tables = load_test_database()
+    candidates = SmartRelationshipDetector(tables, random_state=0).find_relationships()
+
+    # Un k que corta un grupo de candidatos con la misma confianza (empate)
+    scores = [c.confidence_score for c in candidates]
+    tie_k = next(i for i in range(1, len(scores)) if scores[i - 1] == scores[i])
+
+    for k in (10, tie_k):
+        top = SmartRelationshipDetector(tables, random_state=0).find_relationships(top_n=k)
+        if [candidate_key(c) for c in top] == [candidate_key(c) for c in candidates[:k]]:
+            print(f"\n✅ CORRECTO: top_n={k} coincide con los {k} primeros de la lista completa")
+        else:
+            print(f"\n❌ ERROR: top_n={k} no coincide con los {k} primeros de la lista completa")
+
+def test_random_state():
+    """Prueba que la misma semilla toma las mismas muestras de valores y otra semilla no"""
+    print("\n\n🧪 TEST: Muestras reproducibles (random_state)")
+    print("=" * 60)
+
+    tables = load_test_database()
+
+    def sample_values(seed):
+        detector = SmartRelationshipDetector(tables, random_state=seed)
+        detector.analyze_columns()
+        return {key: profile.sample_values for key, profile in detector.column_profiles.items()}
+
+    if sample_values(42) == sample_values(42):
+        print("\n✅ CORRECTO: La misma semilla produce las mismas muestras")
+    else:
+        print("\n❌ ERROR: La misma semilla produjo muestras distintas")
+
+    if sample_values(42) != sample_values(7):
+        print("✅ CORRECTO: Otra semilla produce muestras distintas")
+    else:
+        print("❌ ERROR: Otra semilla produjo las mismas muestras")
+
+if __name__ == "__main__":
+    test_parallel_detection()
+    test_top_n()
+    test_random_state()